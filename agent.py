@@ -1,18 +1,31 @@
 # Import necessary libraries
-from langchain_openai import ChatOpenAI
 from browser_use import Agent, Browser, BrowserConfig, Controller
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, ValidationError # Added ValidationError for better error handling
-from typing import List, Optional # Optional might be useful if some fields aren't always present
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError # Added ValidationError for better error handling
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Final, List, Literal, Optional, Set, Tuple, Type # Optional might be useful if some fields aren't always present
 import pandas as pd
 import asyncio
+from contextlib import asynccontextmanager
+import argparse
+import sys
+import functools
+import shutil
 import os # To securely get environment variables
-import traceback # For detailed error logging
-from langchain_google_genai import ChatGoogleGenerativeAI
+import logging
+import hashlib # For cache keys
+import json
+import tempfile
+import time
+import re
+import urllib.parse
 
+if TYPE_CHECKING:
+    import httpx
 
-# Load environment variables from .env file
-load_dotenv()
+
+# .env loading and logging setup happen in the script entry point, so importing this module has no side effects
+log = logging.getLogger(__name__)
 
 # --- Pydantic Models for Data Structure ---
 
@@ -37,163 +50,813 @@ class Listings(BaseModel):
     """Represents a list of deal listings."""
     listings: List[Listing]
 
+class PaginationURLs(BaseModel):
+    """Represents the URLs of every page of a paginated listing."""
+    urls: List[str]
+
+@dataclass(slots=True)
+class ListingRow:
+    """Lightweight in-memory copy of an already validated Listing."""
+    title: str
+    state: str
+    revenue: Optional[float]
+    ebitda: Optional[float]
+    asking_price: Optional[float]
+
+# Built once at import so each validation goes straight to the compiled core validator
+_LISTINGS_ADAPTER = TypeAdapter(Listings)
+_PAGINATION_ADAPTER = TypeAdapter(PaginationURLs)
+
+
+# --- Result Cache ---
+
+CACHE_DIR = os.getenv("CACHE_DIR", ".scrape_cache")
+SEMANTIC_CACHE_THRESHOLD = 0.93
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 6 * 60 * 60)) # Listings change, so cached results expire
+
+_embedder = None # Lazily loaded sentence-transformers model (optional dependency)
+
+
+def normalize_task(task: str) -> str:
+    """Collapses whitespace and drops trailing punctuation so trivially different task strings compare equal."""
+    return re.sub(r"\s+", " ", task.strip()).rstrip(" .!")
+
 
-async def main():
+def normalize_url(url: str) -> str:
+    """Lowercases the host and drops a trailing slash; the path keeps its case."""
+    parts = urllib.parse.urlsplit(url.strip())
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+def task_signature(task: str, url: str) -> str:
+    """Normalizes task with its inline URL masked out, so URL spelling only affects the key through normalize_url()."""
+    return normalize_task(task.replace(url, "<url>"))
+
+
+def cache_key(task: str, url: str, model: str) -> str:
+    """Returns the exact-match cache key for a task run against url with model."""
+    return hashlib.sha256(f"{model}|{normalize_url(url)}|{task_signature(task, url)}".encode("utf-8")).hexdigest()
+
+
+def _embed(text: str):
+    """Returns a normalized embedding for text, or None if sentence-transformers is not installed."""
+    global _embedder
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        return None
+    if _embedder is None:
+        _embedder = SentenceTransformer("all-MiniLM-L6-v2")
+    return _embedder.encode([text], normalize_embeddings=True).astype("float32")
+
+
+def llm_cache_path() -> str:
     """
-    Main asynchronous function to run the web scraping agent.
+    Returns the SQLite LLM cache for the current CACHE_TTL_SECONDS window and deletes older windows.
+    SQLiteCache has no expiry of its own, and its keys hold whole serialized prompts (screenshots included),
+    so rotating the file keeps both staleness and disk use bounded.
     """
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    google_api_key = os.getenv("GEMINI_API_KEY")
-    
-    if not openai_api_key:
-        print("Error: OPENAI_API_KEY environment variable not set.")
-        return
-    if not google_api_key:
-        print("Error: GEMINI_API_KEY environment variable not set.")
-        return
+    current = f"llm_cache_{int(time.time() // CACHE_TTL_SECONDS)}.db"
+    for name in os.listdir(CACHE_DIR):
+        if name.startswith("llm_cache") and name.endswith(".db") and name != current:
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                log.warning("Could not remove expired LLM cache %s", name, exc_info=True)
+    return os.path.join(CACHE_DIR, current)
+
+
+def _is_fresh(entry: dict) -> bool:
+    """Returns whether a cache entry is younger than CACHE_TTL_SECONDS."""
+    return time.time() - entry.get("saved_at", 0) < CACHE_TTL_SECONDS
+
+
+def _semantic_backend():
+    """
+    Returns (faiss, numpy) if semantic matching is possible, else None.
+    Semantic matching is optional; _embed() additionally needs sentence-transformers.
+    """
+    try:
+        import faiss
+        import numpy as np
+    except ImportError:
+        return None
+    return faiss, np
+
+
+def load_cached_result(task: str, url: str, model: str) -> Optional[str]:
+    """
+    Returns the stored final JSON for a task, or None on a cache miss or if the entry has expired.
+    Tries an exact match on the normalized key first, then a semantic match over previously cached
+    tasks for the same URL and model. Any error while reading the cache is logged and treated as a miss.
+    """
+    try:
+        return _lookup_cached_result(task, url, model)
+    except Exception:
+        log.warning("Cache lookup failed, scraping instead", exc_info=True)
+        return None
+
+
+def _read_cache_entry(path: str) -> Optional[dict]:
+    """Reads one cache entry, or returns None (with a warning) if the file is unreadable or corrupt."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        log.warning("Ignoring unreadable cache entry %s", path, exc_info=True)
+        return None
+
+
+def _lookup_cached_result(task: str, url: str, model: str) -> Optional[str]:
+    path = os.path.join(CACHE_DIR, f"{cache_key(task, url, model)}.json")
+    entry = _read_cache_entry(path) if os.path.exists(path) else None
+    if entry is not None and _is_fresh(entry):
+        return entry["final_data_json"]
+
+    backend = _semantic_backend()
+    if backend is None:
+        return None
+    faiss, np = backend
+    query = _embed(task_signature(task, url))
+    if query is None:
+        return None
+
+    entries = []
+    for name in os.listdir(CACHE_DIR) if os.path.isdir(CACHE_DIR) else []:
+        if not name.endswith(".json"):
+            continue
+        entry = _read_cache_entry(os.path.join(CACHE_DIR, name))
+        if entry and entry.get("embedding") and entry.get("url") == normalize_url(url) and entry.get("model") == model and _is_fresh(entry):
+            entries.append(entry)
+    if not entries:
+        return None
+
+    index = faiss.IndexFlatIP(query.shape[1])
+    index.add(np.array([entry["embedding"] for entry in entries], dtype="float32"))
+    scores, ids = index.search(query, 1)
+    if scores[0][0] >= SEMANTIC_CACHE_THRESHOLD:
+        return entries[ids[0][0]]["final_data_json"]
+    return None
+
+
+def save_cached_result(task: str, url: str, model: str, final_data_json: str) -> None:
+    """
+    Stores the agent's final JSON so identical (or near-identical) tasks can skip the agent.
+    The task embedding is stored alongside it, so semantic lookups never re-encode cached tasks.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{cache_key(task, url, model)}.json")
+    signature = task_signature(task, url)
+    # Only embed when the entry can later be searched; otherwise loading the model is wasted work
+    embedding = _embed(signature) if _semantic_backend() is not None else None
+    entry = {
+        "task": signature,
+        "embedding": embedding[0].tolist() if embedding is not None else None,
+        "url": normalize_url(url),
+        "model": model,
+        "saved_at": time.time(),
+        "final_data_json": final_data_json,
+    }
+    # Write to a temp file and swap it in, so readers never see a half-written entry
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# --- Export ---
+
+LISTING_COLUMNS = ("title", "state", "revenue", "ebitda", "asking_price")
+
+
+def listings_to_dataframe(listings: List[ListingRow]) -> pd.DataFrame:
+    """
+    Builds a DataFrame from listings column by column.
+    Passing one list per column lets pandas ingest each column in a single pass instead of inferring dtypes row by row.
+    """
+    columns = {name: [] for name in LISTING_COLUMNS}
+    for listing in listings:
+        columns["title"].append(listing.title)
+        columns["state"].append(listing.state)
+        columns["revenue"].append(listing.revenue)
+        columns["ebitda"].append(listing.ebitda)
+        columns["asking_price"].append(listing.asking_price)
+    df = pd.DataFrame(columns)
+    # Nullable extension dtypes keep missing amounts as <NA> instead of falling back to object columns;
+    # states repeat heavily, so they are stored as categories
+    return df.astype({
+        "title": "string",
+        "state": "category",
+        "revenue": "Float64",
+        "ebitda": "Float64",
+        "asking_price": "Float64",
+    })
+
+
+def save_listings_xlsx(listings: List[ListingRow], filename: str) -> None:
+    """
+    Streams listings straight to an .xlsx file, one row at a time.
+    constant_memory mode flushes each row to disk once written, so memory stays flat for large scrapes.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(filename, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, LISTING_COLUMNS)
+        for row, listing in enumerate(listings, start=1):
+            worksheet.write_row(row, 0, (listing.title, listing.state, listing.revenue, listing.ebitda, listing.asking_price))
+    finally:
+        workbook.close()
+
+
+# --- LLM Providers ---
+
+Provider = Literal["openai", "gemini"]
+PROVIDER_API_KEYS = {"openai": "OPENAI_API_KEY", "gemini": "GEMINI_API_KEY"}
+PROVIDER_MODELS = {"openai": "gpt-4o", "gemini": "gemini-2.0-flash-exp"}
+
+_http_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Returns the shared keep-alive HTTP client, so every agent step reuses pooled TCP/TLS connections."""
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        _http_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(retries=2, http2=True),
+            timeout=httpx.Timeout(180.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """
+    Closes the shared HTTP client if it was created.
+    Also drops the cached chat models, which hold on to this client (and to the current event loop),
+    so the next run builds fresh ones.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    get_llm.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm(provider: Provider):
+    """
+    Returns the chat model for provider, building it on first use.
+    Only the chosen provider's LangChain package is imported, which keeps the other one off the startup path.
+    OpenAI requests go through the shared pooled HTTP client; the Gemini client keeps its own gRPC channel
+    open for the lifetime of the cached model instance.
+    """
+    api_key = os.getenv(PROVIDER_API_KEYS[provider])
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=PROVIDER_MODELS[provider], temperature=0, timeout=100, api_key=api_key, http_async_client=get_http_client())
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=PROVIDER_MODELS[provider], temperature=0, timeout=180, api_key=api_key)
+
+
+# --- Prompts ---
+
+# Kept free of timestamps, IDs and other per-run values so providers can cache them as stable prompt prefixes.
+# Task templates put their static instructions first and the URL last for the same reason.
+SYSTEM_MESSAGE: Final = (
+    "You are an autonomous web agent. You must stop execution if:\n"
+    "1. There are no more clickable pagination elements (e.g., 'Next' is missing, disabled, or grayed out).\n"
+    "2. You reach the end of the listings or the page doesn't change after a click.\n"
+    "Scrape only visible data. Do not go to unrelated pages. Be efficient and deterministic."
+)
+
+TASK_TEMPLATE: Final = (
+    "Your goal is to scrape all business listings from the start URL given below and its subsequent pages. "
+    "1. On each page, scrape every visible deal listing, extracting its 'title', 'state', 'revenue', 'ebitda', and 'asking_price' (treat missing values as N/A). "
+    "2. Look for a pagination control labeled 'Next', '>', or the next page number; verify it exists and is clickable (not disabled or representing the current page). "
+    "3. If a clickable 'Next' link/button is found, click it and repeat from step 1. "
+    "4. If no clickable 'Next' element exists, stop immediately and return all listings. "
+    "5. Finally, compile *all* listings into a single JSON object under the key 'listings', matching the required schema. "
+    "Start URL: {url}"
+)
+
+PAGE_TASK_TEMPLATE: Final = (
+    "Scrape every visible deal listing on the page URL given below, extracting its 'title', 'state', 'revenue', 'ebitda', and 'asking_price' (treat missing values as N/A). "
+    "Do not navigate to any other page. Return the listings as a single JSON object under the key 'listings', matching the required schema. "
+    "Page URL: {url}"
+)
+
+PAGINATION_TASK_TEMPLATE: Final = (
+    "Find the pagination control on the page URL given below. Do not scrape any listings. "
+    "Return ONLY the list of pagination URLs (including the current page, in page order) as JSON under the key 'urls'. "
+    "Page URL: {url}"
+)
+
+
+# --- Browser Pool ---
+
+CHROME_CANDIDATES = (
+    'C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe',
+    'C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe',
+)
+
+
+@functools.lru_cache(maxsize=1)
+def find_chrome() -> Optional[str]:
+    """
+    Returns the path to the Chrome executable, or None to let Playwright find it.
+    CHROME_PATH in the environment wins over the standard install locations. Resolved once per process.
+    """
+    for path in (os.getenv("CHROME_PATH"), *CHROME_CANDIDATES, shutil.which("chrome")):
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+MAX_CONCURRENT_SCRAPES = 4
 
+_browser: Optional[Browser] = None
+_browser_lock = asyncio.Lock()
+_scrape_semaphore = asyncio.Semaphore(MAX_CONCURRENT_SCRAPES)
 
-    controller = Controller(output_model=Listings)
 
-   
-    chrome_path = 'C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe'
-    if not os.path.exists(chrome_path):
-        chrome_path_alt = 'C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe'
-        if os.path.exists(chrome_path_alt):
-            chrome_path = chrome_path_alt
-            print(f"Using Chrome path: {chrome_path}")
+async def get_browser() -> Browser:
+    """
+    Returns the shared browser, launching it on first use.
+    Every scrape gets its own context on this browser, so Chrome only cold-starts once per process.
+    """
+    global _browser
+    async with _browser_lock:
+        if _browser is not None:
+            return _browser
+
+        chrome_path = find_chrome()
+        if chrome_path:
+            log.info("Using Chrome path: %s", chrome_path)
         else:
-            print(f"Warning: Chrome executable not found at primary path ({chrome_path}) or alternative path ({chrome_path_alt}).")
-            print("Attempting to run without specifying browser path (might work if Chrome is in system PATH)...")
-            chrome_path = None # Let playwright try to find it
-    else:
-        print(f"Using Chrome path: {chrome_path}")
-
-    browser = Browser(
-        config=BrowserConfig(
-            browser_binary_path=chrome_path,
-            # Consider increasing timeouts if the target site is slow
-            # page_load_timeout=90000, # milliseconds (e.g., 90 seconds)
-            # action_timeout=45000 # milliseconds (e.g., 45 seconds)
+            log.warning("Chrome executable not found at any of: %s.", ", ".join(CHROME_CANDIDATES))
+            log.warning("Attempting to run without specifying browser path (might work if Chrome is in system PATH)...")
+
+        _browser = Browser(
+            config=BrowserConfig(
+                browser_binary_path=chrome_path,
+                # Consider increasing timeouts if the target site is slow
+                # page_load_timeout=90000, # milliseconds (e.g., 90 seconds)
+                # action_timeout=45000 # milliseconds (e.g., 45 seconds)
+            )
         )
-    )
+        return _browser
 
-    initial_url = 'https://www.edisonba.com/pages/listings'
-    initial_actions = [
-        {'open_tab': {'url': initial_url}},
+
+async def close_browser() -> None:
+    """Closes the shared browser if it was launched."""
+    global _browser
+    async with _browser_lock:
+        if _browser is None:
+            return
+        log.info("Closing browser...")
+        try:
+            await _browser.close()
+            log.info("Browser closed successfully.")
+        except Exception as e:
+            log.error("Error closing browser: %s", e)
+        finally:
+            _browser = None
+
+
+async def run_scrape(url: str, task: str, llm, schema: Type[BaseModel] = Listings, max_steps: int = 5) -> Optional[str]:
+    """
+    Runs one agent job in a fresh context on the shared browser and returns its final JSON result.
+    Only the context is closed afterwards; the browser stays up for the next job.
+    """
+    async with _scrape_semaphore:
+        browser = await get_browser()
+        context = await browser.new_context()
+        try:
+            log.info("Initializing scraping agent...")
+            agent = Agent(
+                task=task,
+                llm=llm,
+                browser=browser,
+                browser_context=context,
+                controller=Controller(output_model=schema),
+                initial_actions=[{'open_tab': {'url': url}}],
+                validate_output=True,
+                override_system_message=SYSTEM_MESSAGE,
+            )
+
+            log.info("Running agent to scrape listings starting from: %s", url)
+            result = await agent.run(max_steps=max_steps)
+            log.info("Agent finished running.")
+            return result.final_result()
+        finally:
+            await context.close()
+
+
+# --- Pagination & Extraction ---
+
+# The scale suffix must be a whole token, so 'based' or 'monthly' after a number is not read as B/M
+AMOUNT_PATTERN = re.compile(
+    r"(\$\s*)?(\d[\d,]*(?:\.\d+)?|\.\d+)(?:\s*(thousand|millions?|billions?|mil|mln|mn|mm|bn|k|m|b)\b)?",
+    re.IGNORECASE,
+)
+AMOUNT_MULTIPLIERS = {
+    "thousand": 1e3, "k": 1e3,
+    "million": 1e6, "millions": 1e6, "mil": 1e6, "mln": 1e6, "mn": 1e6, "mm": 1e6, "m": 1e6,
+    "billion": 1e9, "billions": 1e9, "bn": 1e9, "b": 1e9,
+}
+LISTING_SELECTOR = "article.listing, div.listing, div.deal-card"
+EXTRACT_LISTINGS_JS = """els => els.map(e => ({
+    title: e.querySelector('.title, h2, h3')?.innerText?.trim(),
+    state: e.querySelector('.state, [data-state]')?.innerText?.trim(),
+    revenue: e.querySelector('.revenue, [data-revenue]')?.innerText,
+    ebitda: e.querySelector('.ebitda, [data-ebitda]')?.innerText,
+    asking_price: e.querySelector('.asking-price, [data-asking-price]')?.innerText,
+}))"""
+
+
+def page_url(url: str, page: int) -> str:
+    """Returns url with its 'page' query parameter set to page."""
+    parts = urllib.parse.urlsplit(url)
+    query = dict(urllib.parse.parse_qsl(parts.query))
+    query["page"] = str(page)
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def linked_page_number(href: str, url: str) -> Optional[int]:
+    """
+    Returns the 'page' number of href if it paginates url itself (same scheme, host and path), else None.
+    Keeps links like a footer '/blogs/news?page=7' from being mistaken for listing pages.
+    """
+    link, base = urllib.parse.urlsplit(href), urllib.parse.urlsplit(url)
+    if (link.scheme, link.netloc.lower(), link.path.rstrip("/")) != (base.scheme, base.netloc.lower(), base.path.rstrip("/")):
+        return None
+    page = urllib.parse.parse_qs(link.query).get("page", [""])[0]
+    return int(page) if page.isdigit() else None
+
+
+def parse_amount(text: Optional[str]) -> Optional[float]:
+    """
+    Parses a money string like '$1,250,000', '$1.2M' or '$.5 Mil' into a float, or None if it holds no number.
+    The first '$' amount wins over bare numbers such as years, so '2023 Revenue: $5M' parses as 5,000,000.
+    """
+    if not text:
+        return None
+    matches = list(AMOUNT_PATTERN.finditer(text))
+    if not matches:
+        return None
+    match = next((m for m in matches if m.group(1)), matches[0])
+    amount = float(match.group(2).replace(",", ""))
+    if match.group(3):
+        amount *= AMOUNT_MULTIPLIERS[match.group(3).lower()]
+    return amount
+
+
+@asynccontextmanager
+async def open_page(url: str):
+    """Yields a loaded Playwright page for url in a fresh context on the shared browser."""
+    async with _scrape_semaphore:
+        browser = await get_browser()
+        context = await browser.new_context()
+        try:
+            page = await context.get_current_page()
+            await page.goto(url)
+            await page.wait_for_load_state()
+            yield page
+        finally:
+            await context.close()
+
+
+async def read_listings(page) -> List[Listing]:
+    """Reads the listing cards on a loaded page with a plain CSS selector, without calling the LLM."""
+    rows = await page.eval_on_selector_all(LISTING_SELECTOR, EXTRACT_LISTINGS_JS)
+    return [
+        Listing(
+            title=row["title"],
+            state=row["state"] or "N/A",
+            revenue=parse_amount(row["revenue"]),
+            ebitda=parse_amount(row["ebitda"]),
+            asking_price=parse_amount(row["asking_price"]),
+        )
+        for row in rows
+        if row.get("title")
     ]
 
-    llm = ChatGoogleGenerativeAI(model='gemini-2.0-flash-exp', temperature=0, timeout=180, api_key=google_api_key)
 
+async def read_page(url: str) -> Tuple[Set[int], List[Listing]]:
+    """
+    Loads url once and returns the '?page=N' numbers it links to together with the listings the
+    CSS extractor found on it. Never calls the LLM; returns nothing found if the page fails to load.
+    """
+    try:
+        async with open_page(url) as page:
+            hrefs = await page.eval_on_selector_all("a[href*='page=']", "els => els.map(e => e.href)")
+            listings = await read_listings(page)
+    except Exception:
+        # Load timeouts and other browser errors count as a selector miss so the agent fallback still runs.
+        # Caught broadly since browser_use drives either playwright or patchright depending on its version.
+        log.warning("CSS extraction failed on %s, treating it as a miss", url, exc_info=True)
+        return set(), []
+    pages = {page for href in hrefs if (page := linked_page_number(href, url)) is not None}
+    return pages, listings
 
-    task_description = (
-        f"Your goal is to scrape all business listings from {initial_url} and its subsequent pages. "
-        "1. On each page, scrape every visible deal listing, extracting its 'title', 'state', 'revenue', 'ebitda', and 'asking_price' (treat missing values as N/A). "
-        "2. Look for a pagination control labeled 'Next', '>', or the next page number; verify it exists and is clickable (not disabled or representing the current page). "
-        "3. If a clickable 'Next' link/button is found, click it and repeat from step 1. "
-        "4. If no clickable 'Next' element exists, stop immediately and return all listings. "
-        "5. Finally, compile *all* listings into a single JSON object under the key 'listings', matching the required schema."
-    )
 
-    # --- Run the Agent ---
-    scraped_listings = []
+def resolve_page_urls(url: str, links: List[str]) -> List[str]:
+    """
+    Resolves links (possibly relative) against url, drops other hosts and duplicates, and makes sure
+    url itself comes first so the start page's listings are never skipped.
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    resolved = [url]
+    seen = {url.rstrip("/")}
+    for link in links:
+        absolute = urllib.parse.urljoin(url, link.strip())
+        if urllib.parse.urlsplit(absolute).netloc.lower() != host or absolute.rstrip("/") in seen:
+            continue
+        seen.add(absolute.rstrip("/"))
+        resolved.append(absolute)
+    return resolved
+
+
+async def plan_page_urls(url: str, llm) -> List[str]:
+    """
+    Asks the LLM once to enumerate every pagination URL of url, starting with url itself.
+    Returns an empty list if it finds no pages beyond the start page.
+    """
+    result = await run_scrape(
+        url,
+        PAGINATION_TASK_TEMPLATE.format(url=url),
+        llm,
+        schema=PaginationURLs,
+        max_steps=2,
+    )
+    if not result:
+        return []
     try:
-        print("Initializing scraping agent...")
-        agent = Agent(
-            task=task_description,
-            llm=llm,
-            browser=browser,
-            controller=controller,
-            initial_actions=initial_actions,
-            validate_output=True,
-            override_system_message=(
-                "You are an autonomous web agent. You must stop execution if:\n"
-                "1. There are no more clickable pagination elements (e.g., 'Next' is missing, disabled, or grayed out).\n"
-                "2. You reach the end of the listings or the page doesn't change after a click.\n"
-                "Scrape only visible data. Do not go to unrelated pages. Be efficient and deterministic."
-                )
+        links = _PAGINATION_ADAPTER.validate_json(result).urls
+    except ValidationError as ve:
+        log.warning("Invalid pagination URLs returned for %s: %s", url, ve)
+        return []
+    page_urls = resolve_page_urls(url, links)
+    return page_urls if len(page_urls) > 1 else []
+
+
+async def scrape_page(url: str, llm, use_css: bool = True) -> Tuple[Set[int], List[Listing]]:
+    """
+    Scrapes a single listing page and returns the '?page=N' numbers it links to together with its listings.
+    The LLM agent is only used if the CSS selector finds nothing (or use_css is False because that is already known).
+    Raises RuntimeError if the agent returns no data either.
+    """
+    pages, listings = await read_page(url) if use_css else (set(), [])
+    if listings:
+        return pages, listings
+
+    log.info("No listings matched '%s' on %s, falling back to the agent...", LISTING_SELECTOR, url)
+    result = await run_scrape(
+        url,
+        PAGE_TASK_TEMPLATE.format(url=url),
+        llm,
+        max_steps=3,
+    )
+    if not result:
+        raise RuntimeError(f"Agent returned no data for {url}")
+    return pages, _LISTINGS_ADAPTER.validate_json(result).listings
+
+
+async def scrape_all_pages(url: str, task: str, llm) -> Tuple[Optional[Listings], bool]:
+    """
+    Scrapes every listing page and returns the merged, validated Listings (None if the agent returned
+    nothing usable), plus whether every page was scraped.
+    Numbered pages are fetched concurrently in waves: each wave scrapes every page linked so far but not
+    yet fetched, so windowed or 'Next'-only pagination is followed to the last page.
+    Pages are read with the CSS extractor wherever it matches; the LLM is only used to find page URLs
+    the first page doesn't link to, for pages the extractor can't read, and as a last resort a single
+    agent clicking through pagination.
+    """
+    linked_pages, first_page_listings = await read_page(url)
+    linked_pages.discard(1)
+
+    if not linked_pages:
+        if first_page_listings:
+            # Single page that the CSS extractor can read: no LLM call at all
+            return Listings(listings=first_page_listings), True
+
+        page_urls = await plan_page_urls(url, llm)
+        if not page_urls:
+            result = await run_scrape(url, task, llm)
+            if not result:
+                return None, False
+            try:
+                return _LISTINGS_ADAPTER.validate_json(result), True
+            except ValidationError as ve:
+                log.error("Failed to validate the scraped data against the Listings model: %s", ve)
+                log.error("Raw JSON data received from agent:\n%s", result) # Log raw data for debugging
+                return None, False
+
+        log.info("Scraping %d pages concurrently...", len(page_urls))
+        # The probe already showed the CSS extractor can't read the start page, so don't load it again for that
+        results = await asyncio.gather(
+            *(scrape_page(link, llm, use_css=link.rstrip("/") != url.rstrip("/")) for link in page_urls),
+            return_exceptions=True,
         )
+        listings: List[Listing] = []
+        complete = True
+        for link, result in zip(page_urls, results):
+            if isinstance(result, Exception):
+                log.warning("Failed to scrape %s: %s", link, result)
+                complete = False
+                continue
+            listings.extend(result[1])
+        return Listings(listings=listings), complete
 
-        print(f"Running agent to scrape listings starting from: {initial_url}")
-        result = await agent.run(max_steps=5)
-        print("Agent finished running.")
+    listings_by_page = {}
+    if first_page_listings:
+        # The first page was already read during the probe
+        listings_by_page[1] = first_page_listings
+        wave = []
+    else:
+        wave = [(1, scrape_page(url, llm, use_css=False))]
+    wave += [(page, scrape_page(page_url(url, page), llm)) for page in sorted(linked_pages)]
+    seen = {1} | linked_pages
+    complete = True
+
+    while wave:
+        log.info("Scraping %d pages concurrently...", len(wave))
+        results = await asyncio.gather(*(job for _, job in wave), return_exceptions=True)
+        discovered = set()
+        for (page, _), result in zip(wave, results):
+            if isinstance(result, Exception):
+                log.warning("Failed to scrape %s: %s", page_url(url, page), result)
+                complete = False
+                continue
+            linked, listings = result
+            listings_by_page[page] = listings
+            discovered |= linked
+        new_pages = sorted(discovered - seen)
+        seen.update(new_pages)
+        wave = [(page, scrape_page(page_url(url, page), llm)) for page in new_pages]
+
+    merged = [listing for page in sorted(listings_by_page) for listing in listings_by_page[page]]
+    return Listings(listings=merged), complete
+
+
+async def main(provider: Provider = "gemini", export_xlsx: bool = False, refresh: bool = False):
+    """
+    Main asynchronous function to run the web scraping agent with the given LLM provider.
+    Listings are saved to Parquet; pass export_xlsx=True to also write an Excel copy.
+    Pass refresh=True to ignore cached results and scrape the site again.
+    """
+    api_key_var = PROVIDER_API_KEYS[provider]
+    if not os.getenv(api_key_var):
+        log.error("%s environment variable not set.", api_key_var)
+        return
 
-        # --- Process Results ---
-        final_data_json = result.final_result()
 
-        if final_data_json:
-            print("Parsing scraped data...")
+    initial_url = 'https://www.edisonba.com/pages/listings'
+
+    # Cache individual LLM calls on disk so repeated agent steps skip the API round trip.
+    # --refresh must really hit the site again, so it bypasses this cache as well.
+    if not refresh:
+        # Imported here rather than at module level: langchain_community pulls in SQLAlchemy.
+        from langchain_core.globals import set_llm_cache
+        from langchain_community.cache import SQLiteCache
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        set_llm_cache(SQLiteCache(database_path=llm_cache_path()))
+
+    llm = get_llm(provider)
+
+
+    task_description = TASK_TEMPLATE.format(url=initial_url)
+
+    # --- Run the Agent ---
+    scraped_listings: List[ListingRow] = []
+    should_cache = False
+    try:
+        parsed: Optional[Listings] = None
+        complete = True
+        cached_json = None if refresh else load_cached_result(task_description, initial_url, PROVIDER_MODELS[provider])
+        from_cache = False
+        if cached_json is not None:
             try:
-                # Validate the JSON data against the Pydantic model
-                parsed: Listings = Listings.model_validate_json(final_data_json)
-                print("--------------------------------")
-                print("Parsed Listings:")
-                print("--------------------------------")
+                parsed = _LISTINGS_ADAPTER.validate_json(cached_json)
+                from_cache = True
+                log.info("Using cached agent result, skipping agent run.")
+            except ValidationError as ve:
+                log.warning("Ignoring cached result that no longer matches the Listings model: %s", ve)
+        if not from_cache:
+            # Comes back already validated, so there is no JSON round trip here
+            parsed, complete = await scrape_all_pages(initial_url, task_description, llm)
 
+        # --- Process Results ---
+        if parsed is not None:
+            try:
+                # Only cache complete, non-empty results; a partial scrape would otherwise be served until it expires
+                should_cache = not from_cache and complete and bool(parsed.listings)
+                if not from_cache and not should_cache:
+                    log.warning("Some pages failed or no listings were found, not caching this result.")
+                # Collect the per-listing details and write them in one go instead of one print() per field
+                lines = ["--------------------------------\nParsed Listings:\n--------------------------------\n"]
                 for listing in parsed.listings:
-                    # Append the validated listing object directly
-                    scraped_listings.append(listing)
-                    # Print details (including EBITDA)
-                    print(f"  Title:          {listing.title}")
-                    print(f"  State:          {listing.state}")
-                    print(f"  Revenue:        {listing.revenue if listing.revenue is not None else 'N/A'}")
-                    print(f"  EBITDA:         {listing.ebitda if listing.ebitda is not None else 'N/A'}") # Added EBITDA print
-                    print(f"  Asking Price:   {listing.asking_price if listing.asking_price is not None else 'N/A'}")
-                    print("  ---")
+                    # Keep a slotted copy only; the validated Pydantic model isn't needed past this point
+                    scraped_listings.append(ListingRow(listing.title, listing.state, listing.revenue, listing.ebitda, listing.asking_price))
+                    lines.append(
+                        f"  Title:          {listing.title}\n"
+                        f"  State:          {listing.state}\n"
+                        f"  Revenue:        {listing.revenue if listing.revenue is not None else 'N/A'}\n"
+                        f"  EBITDA:         {listing.ebitda if listing.ebitda is not None else 'N/A'}\n"
+                        f"  Asking Price:   {listing.asking_price if listing.asking_price is not None else 'N/A'}\n"
+                        "  ---\n"
+                    )
+                sys.stdout.write("".join(lines))
+                sys.stdout.flush()
 
-            except ValidationError as ve:
-                print(f"\nError: Failed to validate the scraped data against the Listings model.")
-                print(f"Validation Errors: {ve}")
-                print("\nRaw JSON data received from agent:")
-                print(final_data_json) # Print raw data for debugging
-            except Exception as e:
-                 print(f"\nError processing agent results: {e}")
-                 print("\nRaw JSON data received from agent:")
-                 print(final_data_json) # Print raw data for debugging
+            except Exception:
+                log.exception("Error processing agent results")
 
         else:
-            print("Agent did not return any final data.")
+            log.warning("Agent did not return any final data.")
 
-        print("--------------------------------")
-        print(f"Total listings scraped: {len(scraped_listings)}")
-        print("--------------------------------")
+        log.info("Total listings scraped: %d", len(scraped_listings))
 
-        # --- Save to Excel ---
+        # --- Save Listings ---
         if scraped_listings:
-            print("Saving listings to Excel...")
+            log.info("Saving listings to Parquet...")
             try:
-                # Use model_dump() to convert Pydantic models to dictionaries for DataFrame
-                df = pd.DataFrame([listing.model_dump() for listing in scraped_listings])
-                excel_filename = "edisonba_listings.xlsx" # Changed filename
-                df.to_excel(excel_filename, index=False)
-                print(f"Listings successfully saved to {excel_filename}")
-            except Exception as e:
-                print(f"Error saving listings to Excel: {e}")
+                df = listings_to_dataframe(scraped_listings)
+                parquet_filename = "edisonba_listings.parquet"
+                df.to_parquet(parquet_filename, index=False, compression="zstd")
+                log.info("Listings successfully saved to %s", parquet_filename)
+            except Exception:
+                log.exception("Error saving listings to Parquet")
+
+            if export_xlsx:
+                log.info("Saving listings to Excel...")
+                try:
+                    excel_filename = "edisonba_listings.xlsx" # Changed filename
+                    save_listings_xlsx(scraped_listings, excel_filename)
+                    log.info("Listings successfully saved to %s", excel_filename)
+                except Exception:
+                    log.exception("Error saving listings to Excel")
         else:
-            print("No listings were scraped, skipping Excel save.")
+            log.info("No listings were scraped, skipping save.")
 
-        print("--------------------------------")
+        # --- Cache Result ---
+        # Written last and guarded on its own, so a cache failure can never cost a successful scrape
+        if should_cache:
+            try:
+                save_cached_result(task_description, initial_url, PROVIDER_MODELS[provider], parsed.model_dump_json())
+            except Exception:
+                log.warning("Could not cache the scraped result", exc_info=True)
 
-    except Exception as e:
+    except Exception:
         # Catch potential errors during agent execution or setup
-        print(f"\n--- An unexpected error occurred during agent execution ---")
-        print(f"Error Type: {type(e).__name__}")
-        print(f"Error Message: {e}")
-        print("Traceback:")
-        traceback.print_exc()
-        print("----------------------------------------------------------")
+        log.exception("An unexpected error occurred during agent execution")
 
     finally:
         # --- Cleanup ---
-        print("Closing browser...")
-        try:
-            await browser.close()
-            print("Browser closed successfully.")
-        except Exception as e:
-            print(f"Error closing browser: {str(e)}")
+        await close_browser()
+        await close_http_client()
 
 # --- Script Entry Point ---
 if __name__ == "__main__":
-    print("Starting script execution...")
-    asyncio.run(main())
-    print("Script execution finished.")
+    parser = argparse.ArgumentParser(description="Scrape business listings with a browser-use agent.")
+    parser.add_argument("--provider", choices=list(PROVIDER_API_KEYS), default="gemini", help="LLM provider to drive the agent with.")
+    parser.add_argument("--xlsx", action="store_true", help="Also export listings to an Excel file.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached results and scrape the site again.")
+    args = parser.parse_args()
+
+    # Load environment variables from .env file, then re-read the settings that come from the environment
+    load_dotenv()
+    CACHE_DIR = os.getenv("CACHE_DIR", CACHE_DIR)
+    CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", CACHE_TTL_SECONDS))
+
+    # Configure logging once; set LOGLEVEL=WARNING to silence progress messages.
+    # force=True replaces the root handler browser_use installs on import, which would otherwise make this a no-op.
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s", force=True)
+
+    log.info("Starting script execution...")
+    # Use a libuv-based event loop where available (uvloop on POSIX, winloop on Windows)
+    try:
+        import uvloop as fast_loop
+    except ImportError:
+        try:
+            import winloop as fast_loop
+        except ImportError:
+            fast_loop = None
+    coro = main(provider=args.provider, export_xlsx=args.xlsx, refresh=args.refresh)
+    if fast_loop is not None and sys.version_info >= (3, 12):
+        asyncio.run(coro, loop_factory=fast_loop.new_event_loop)
+    else:
+        if fast_loop is not None:
+            fast_loop.install() # Deprecated on 3.12+, only used where asyncio.run() has no loop_factory
+        asyncio.run(coro)
+    log.info("Script execution finished.")
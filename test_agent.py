@@ -0,0 +1,93 @@
+import pytest
+
+from agent import cache_key, linked_page_number, normalize_url, page_url, parse_amount, resolve_page_urls
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("$1,250,000", 1_250_000.0),
+        ("$1.2M", 1_200_000.0),
+        ("$500K", 500_000.0),
+        ("$2.5 million", 2_500_000.0),
+        ("$4.1MM", 4_100_000.0),
+        ("$250,000 based on TTM", 250_000.0),
+        ("$3,500,000 monthly", 3_500_000.0),
+        ("2023 Revenue: $5M", 5_000_000.0),
+        ("$.5M", 500_000.0),
+        ("$1.2 Mil", 1_200_000.0),
+        ("$3.5 Mn", 3_500_000.0),
+        ("$2 Bn", 2_000_000_000.0),
+        ("1,000", 1_000.0),
+        ("N/A", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == (expected if expected is None else pytest.approx(expected))
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://WWW.EdisonBA.com/pages/listings/", "www.edisonba.com/pages/listings"),
+        ("https://www.edisonba.com/pages/listings", "www.edisonba.com/pages/listings"),
+        ("https://www.edisonba.com/Pages/Listings", "www.edisonba.com/Pages/Listings"),
+        ("  https://www.edisonba.com/pages/listings?page=2 ", "www.edisonba.com/pages/listings"),
+    ],
+)
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_cache_key_ignores_trivial_task_and_url_differences():
+    url = "https://www.edisonba.com/pages/listings"
+    task = f"Scrape every listing.  Start URL: {url}"
+    assert cache_key(task, url, "gemini") == cache_key(
+        f"Scrape every listing. Start URL: {url}/.", f"{url}/", "gemini"
+    )
+
+
+def test_cache_key_depends_on_model_and_url():
+    url = "https://www.edisonba.com/pages/listings"
+    task = f"Scrape every listing. Start URL: {url}"
+    assert cache_key(task, url, "gemini") != cache_key(task, url, "gpt-4o")
+    other = "https://www.edisonba.com/pages/sold"
+    assert cache_key(task, url, "gemini") != cache_key(task.replace(url, other), other, "gemini")
+
+
+@pytest.mark.parametrize(
+    "url, page, expected",
+    [
+        ("https://x.com/pages/listings", 2, "https://x.com/pages/listings?page=2"),
+        ("https://x.com/pages/listings?page=1", 3, "https://x.com/pages/listings?page=3"),
+        ("https://x.com/pages/listings?sort=new", 2, "https://x.com/pages/listings?sort=new&page=2"),
+    ],
+)
+def test_page_url(url, page, expected):
+    assert page_url(url, page) == expected
+
+
+@pytest.mark.parametrize(
+    "href, expected",
+    [
+        ("https://x.com/pages/listings?page=3", 3),
+        ("https://X.com/pages/listings/?page=2&sort=new", 2),
+        ("https://x.com/blogs/news?page=7", None),
+        ("http://x.com/pages/listings?page=2", None),
+        ("https://x.com/pages/listings?page=next", None),
+    ],
+)
+def test_linked_page_number(href, expected):
+    assert linked_page_number(href, "https://x.com/pages/listings") == expected
+
+
+def test_resolve_page_urls():
+    url = "https://x.com/pages/listings"
+    links = ["/pages/listings?page=2", "https://other.com/pages/listings?page=3", f"{url}/", "?page=2", "?page=3"]
+    assert resolve_page_urls(url, links) == [
+        url,
+        "https://x.com/pages/listings?page=2",
+        "https://x.com/pages/listings?page=3",
+    ]